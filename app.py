@@ -5,33 +5,247 @@ FloorIQ Dashboard (IQ model preview)
 - Does not alter existing dashboard; runs on a separate port for review
 """
 
-import math
-import random
-from statistics import mean, pstdev
-from datetime import datetime, timedelta
-from typing import Dict, List, Tuple
-
-from flask import Flask, render_template, jsonify
+import gzip
+import hashlib
+import os
+import stat
+import tempfile
+from datetime import date, datetime, timedelta
+from functools import cache, lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import orjson
+from flask import Flask, Response, g, render_template, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+try:
+    from flask_caching import Cache
+except ImportError:  # response caching is optional
+    Cache = None
+
+try:
+    from pyinstrument import Profiler
+except ImportError:  # profiling is optional (dev/staging only)
+    Profiler = None
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:  # JIT is optional; kernels run as plain NumPy
+    HAVE_NUMBA = False
+
+    def njit(**kwargs):
+        return lambda fn: fn
 
 
 HOURS_OPEN_PER_WEEK = 168  # MVP default
+INV_HOURS = 1.0 / HOURS_OPEN_PER_WEEK
+# Fixed seed keeps the synthetic dataset stable across restarts and workers
+DATASET_SEED = int(os.environ.get('FLOORIQ_SEED', '2025'))
+
+
+class EquipRec(NamedTuple):
+    """One machine as served by /api/equipment (field order is the JSON key order)."""
+    id: str
+    name: str
+    type: str
+    category: str
+    total_minutes: int
+    weekly_change: int
+    trend: str
+    trend_text: str
+    peak_hours: str
+    report_period: str
+    mph: float
+    mph_prev: float
+    iq: int
+    iq_prev: int
+    delta_iq: int
+
+
+# Column names: generated base fields, then fields filled in by compute_iq_fields
+BASE_FIELDS = EquipRec._fields[:10]
+IQ_FIELDS = EquipRec._fields[10:]
+
+
+@njit(cache=True)
+def _welford_mean_pstdev(vals: np.ndarray) -> Tuple[float, float]:
+    # Welford's single-pass mean and population standard deviation
+    mean = 0.0
+    m2 = 0.0
+    for count in range(1, len(vals) + 1):
+        x = vals[count - 1]
+        delta = x - mean
+        mean += delta / count
+        m2 += (x - mean) * delta
+    return mean, np.sqrt(m2 / len(vals))
+
+
+def _numpy_mean_pstdev(vals: np.ndarray) -> Tuple[float, float]:
+    return vals.mean(), vals.std()
+
+
+# The Welford loop only pays off when compiled; without Numba plain NumPy is faster
+mean_pstdev = _welford_mean_pstdev if HAVE_NUMBA else _numpy_mean_pstdev
+
+
+@njit(cache=True, fastmath=True)
+def compute_iq_arr(mph: np.ndarray, mu: np.ndarray, sigma: np.ndarray) -> np.ndarray:
+    # Multiply by 1/sigma rather than divide so LLVM can vectorize the loop
+    z = (mph - mu) * (1.0 / sigma)
+    return np.clip(np.rint(100.0 + 15.0 * z), 0, 200).astype(np.int32)
+
+
+@cache
+def band_for_score(iq: int) -> str:
+    if iq < 90:
+        return 'Below Average'
+    elif iq <= 110:
+        return 'Average'
+    return 'Above Average'
+
+
+@lru_cache(maxsize=4)
+def _week_label_for(ordinal: int) -> str:
+    today = date.fromordinal(ordinal)
+    week_start = today - timedelta(days=today.weekday())
+    week_end = week_start + timedelta(days=6)
+    start_fmt_month = week_start.strftime('%b')
+    end_fmt_month = week_end.strftime('%b')
+    if week_start.month == week_end.month:
+        label = f"{start_fmt_month} {week_start.day}–{week_end.day}, {week_end.year}"
+    else:
+        label = f"{start_fmt_month} {week_start.day} – {end_fmt_month} {week_end.day}, {week_end.year}"
+    return label
 
 
 class FloorIQIQApp:
-    def __init__(self):
+    # Peak-hours population with cumulative weights (36, 22, 12, 18, 20, 4)
+    _PEAK_POP = np.array(['5-8pm', '6-9am', '12-2pm', '7-9pm', '6-8pm', '--'])
+    _PEAK_CUMW = np.array([36, 58, 70, 88, 108, 112])
+    _TREND_LABELS = np.array(['stable', 'up', 'down'])
+
+    # Kept for callers of the former staticmethod; shares the module-level cache
+    band_for_score = staticmethod(band_for_score)
+
+    def __init__(self, production: bool = False):
+        self.production = production
         self.app = Flask(__name__)
         self.app.config['SECRET_KEY'] = 'flooriq-iq-model-2025'
-        self.app.config['TEMPLATES_AUTO_RELOAD'] = True
+        # Auto-reload stats the template file on every render; dev only
+        self.app.config['TEMPLATES_AUTO_RELOAD'] = not production
         self.app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
 
-        # Generate baseline equipment data (same schema as existing app, but independent)
-        self.equipment_data = self.generate_equipment_data()
-        # Compute IQ fields
-        self.compute_iq_fields(self.equipment_data)
+        # Baseline equipment data as parallel columns, with IQ fields computed
+        self.cols = self.load_dataset()
+        # Gym IQ: mean of machine IQs
+        self.gym_iq = int(round(self.cols['iq'].mean())) if len(self.cols['iq']) else 100
+        self.gym_band = band_for_score(self.gym_iq)
+        # Row-oriented records are only needed for the JSON endpoint
+        self.equipment_data = self.build_equipment_records(self.cols)
+        # Equipment data is immutable after init, so serialize it once
+        self._equipment_bytes = orjson.dumps({'success': True,
+                                              'equipment': [r._asdict() for r in self.equipment_data],
+                                              'total_count': len(self.equipment_data)})
+        # Pre-compressed variants, in order of preference
+        self._equipment_encoded: Dict[str, bytes] = {}
+        if brotli is not None:
+            self._equipment_encoded['br'] = brotli.compress(self._equipment_bytes, quality=5)
+        self._equipment_encoded['gzip'] = gzip.compress(self._equipment_bytes, compresslevel=6)
+        # Summary payload is reused until the date changes
+        self._summary_ordinal = None
+        self._summary: Tuple[bytes, str] = (b'', '')
+        self.get_summary()
+
+        # Optional shared response cache (flask-caching + Redis). Production already keeps
+        # the rendered page in memory for the day, so Redis would only add a round trip.
+        self.cache = None
+        redis_url = os.environ.get('FLOORIQ_REDIS_URL')
+        if redis_url and not production:
+            if Cache is None:
+                self.app.logger.warning('FLOORIQ_REDIS_URL is set but flask-caching is not '
+                                        'installed; response caching is disabled')
+            else:
+                self.cache = Cache(self.app, config={'CACHE_TYPE': 'RedisCache',
+                                                     'CACHE_REDIS_URL': redis_url,
+                                                     'CACHE_DEFAULT_TIMEOUT': 30})
+        # Compiled template and per-day rendered page (production only)
+        self._tmpl = None
+        self._dashboard_ordinal = None
+        self._dashboard_html = ''
+        # Last successfully rendered dashboard, served if rendering fails
+        self._last_dashboard_html = None
 
         self.setup_routes()
+        if os.environ.get('FLOORIQ_PROFILE') == '1':
+            if Profiler is None:
+                self.app.logger.warning('FLOORIQ_PROFILE is set but pyinstrument is not '
+                                        'installed; request profiling is disabled')
+            else:
+                self.setup_profiler()
 
-    def generate_equipment_data(self) -> List[Dict]:
+    @staticmethod
+    def dataset_cache_dir() -> Optional[str]:
+        # Private per-user directory so other users cannot plant or swap cache files
+        uid = os.getuid() if hasattr(os, 'getuid') else None
+        path = os.path.join(tempfile.gettempdir(), f'flooriq-{uid if uid is not None else "cache"}')
+        try:
+            os.makedirs(path, mode=0o700, exist_ok=True)
+            st = os.lstat(path)
+        except OSError:
+            return None
+        if not stat.S_ISDIR(st.st_mode):
+            return None
+        if uid is not None and (st.st_uid != uid or st.st_mode & 0o077):
+            return None
+        return path
+
+    def load_dataset(self) -> Dict[str, np.ndarray]:
+        cache_dir = self.dataset_cache_dir()
+        if cache_dir is None:
+            cols = self.generate_equipment_data()
+            self.compute_iq_fields(cols)
+            return cols
+
+        # Cache keyed by source hash + seed so edits or a new seed regenerate the data
+        with open(__file__, 'rb') as f:
+            src_hash = hashlib.blake2b(f.read()).hexdigest()[:12]
+        cache_path = os.path.join(cache_dir, f'flooriq_{src_hash}_{DATASET_SEED}.npz')
+        if os.path.exists(cache_path):
+            try:
+                with np.load(cache_path, allow_pickle=False) as data:
+                    return {key: data[key] for key in EquipRec._fields}
+            except Exception:
+                # Empty, truncated or stale file: drop it and regenerate
+                try:
+                    os.remove(cache_path)
+                except OSError:
+                    pass
+
+        cols = self.generate_equipment_data()
+        self.compute_iq_fields(cols)
+        # Write to a unique temp file then rename, so concurrent workers never read a partial file
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.npz.tmp')
+        except OSError:
+            return cols
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **cols)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return cols
+
+    def generate_equipment_data(self) -> Dict[str, np.ndarray]:
         equipment_types = [
             ('Treadmill', 'Cardio'),
             ('Elliptical', 'Cardio'),
@@ -57,146 +271,203 @@ class FloorIQIQApp:
             ('Hack Squat', 'Strength'),
         ]
 
-        items = []
-        for i in range(55):
-            equipment_type, category = random.choice(equipment_types)
-            equipment_num = i + 1
+        n = 55
+        rng = np.random.default_rng(DATASET_SEED)
+        type_names = np.array([t for t, _ in equipment_types])
+        type_cats = np.array([c for _, c in equipment_types])
+
+        type_idx = rng.integers(0, len(equipment_types), size=n)
+        types = type_names[type_idx]
+        categories = type_cats[type_idx]
+
+        # New gym baselines (consistent with current working dashboard)
+        base = np.where(categories == 'Cardio',
+                        rng.integers(220, 521, size=n),
+                        rng.integers(140, 421, size=n))
+        base = np.where(np.isin(types, ['Squat Rack', 'Bench Press']),
+                        base + rng.integers(60, 141, size=n), base)
+        base = np.where(np.isin(types, ['Leg Extension', 'Cable Machine']),
+                        np.maximum(base - rng.integers(20, 61, size=n), 90), base)
+
+        growth_roll = rng.random(n)
+        growth_pct = np.where(growth_roll < 0.7, rng.uniform(0.05, 0.22, size=n),
+                              np.where(growth_roll < 0.9, 0.0, -rng.uniform(0.02, 0.10, size=n)))
+
+        peak_idx = np.searchsorted(self._PEAK_CUMW, rng.random(n) * self._PEAK_CUMW[-1], side='right')
+        peak_hours = self._PEAK_POP[peak_idx]
+
+        prev_week_minutes = np.rint(base / (1 + growth_pct)).astype(base.dtype)
+        weekly_change = base - prev_week_minutes
+        trend_idx = np.where(np.abs(weekly_change) < 25, 0, np.where(weekly_change > 0, 1, 2))
+
+        nums = range(1, n + 1)
+        return {
+            'id': np.array([f'equipment_{num:03d}' for num in nums]),
+            'name': np.array([f'{t} {num}' for t, num in zip(types.tolist(), nums)]),
+            'type': types,
+            'category': categories,
+            'total_minutes': base,
+            'weekly_change': weekly_change,
+            'trend': self._TREND_LABELS[trend_idx],
+            'trend_text': np.full(n, '—'),  # will be replaced in template with pts
+            'peak_hours': peak_hours,
+            'report_period': np.full(n, 'Week ending Aug 18, 2025'),
+        }
+
+    def compute_iq_fields(self, cols: Dict[str, np.ndarray]):
+        n = len(cols['total_minutes'])
+        if n == 0:
+            for key in IQ_FIELDS:
+                cols[key] = np.zeros(0, dtype=np.int64)
+            return
 
-            # New gym baselines (consistent with current working dashboard)
-            if category == 'Cardio':
-                base_minutes = random.randint(220, 520)
-            else:
-                base_minutes = random.randint(140, 420)
-
-            if equipment_type in ['Squat Rack', 'Bench Press']:
-                base_minutes += random.randint(60, 140)
-            if equipment_type in ['Leg Extension', 'Cable Machine']:
-                base_minutes = max(base_minutes - random.randint(20, 60), 90)
-
-            roll = random.random()
-            if roll < 0.7:
-                growth_pct = random.uniform(0.05, 0.22)
-            elif roll < 0.9:
-                growth_pct = 0.0
-            else:
-                growth_pct = -random.uniform(0.02, 0.10)
-
-            prev_week_minutes = int(round(base_minutes / (1 + (growth_pct if growth_pct != -1 else 0.0))))
-            weekly_change = base_minutes - prev_week_minutes
-
-            items.append({
-                'id': f'equipment_{equipment_num:03d}',
-                'name': f'{equipment_type} {equipment_num}',
-                'type': equipment_type,
-                'category': category,
-                'total_minutes': base_minutes,
-                'weekly_change': weekly_change,
-                'trend': ('stable' if abs(weekly_change) < 25 else ('up' if weekly_change > 0 else 'down')),
-                'trend_text': '—',  # will be replaced in template with pts
-                'peak_hours': random.choices(
-                    population=['5-8pm', '6-9am', '12-2pm', '7-9pm', '6-8pm', '--'],
-                    weights=[36, 22, 12, 18, 20, 4],
-                    k=1
-                )[0],
-                'report_period': 'Week ending Aug 18, 2025',
-            })
-
-        return items
-
-    def compute_iq_fields(self, items: List[Dict]):
         # Compute minutes per hour (mph) for current and previous week
-        for it in items:
-            it['mph'] = it['total_minutes'] / HOURS_OPEN_PER_WEEK
-            prev_minutes = max(0, it['total_minutes'] - it['weekly_change'])
-            it['mph_prev'] = prev_minutes / HOURS_OPEN_PER_WEEK
-
-        # Group by category for baselines
-        by_cat: Dict[str, List[float]] = {}
-        for it in items:
-            by_cat.setdefault(it['category'], []).append(it['mph'])
+        total = cols['total_minutes'].astype(np.float64)
+        change = cols['weekly_change'].astype(np.float64)
+        mph = total * INV_HOURS
+        mph_prev = np.maximum(total - change, 0.0) * INV_HOURS
+        cats = cols['category']
 
         # Gym-wide baseline
-        gym_mph_list = [it['mph'] for it in items]
-        gym_mu = mean(gym_mph_list)
-        gym_sigma = pstdev(gym_mph_list) if len(gym_mph_list) > 1 else 1.0
-        if gym_sigma == 0: gym_sigma = 1.0
+        gym_mu, gym_sigma = mean_pstdev(mph)
+        if n <= 1 or gym_sigma == 0: gym_sigma = 1.0
 
         # Category baselines with fallback
-        cat_baselines: Dict[str, Tuple[float, float]] = {}
-        for c, vals in by_cat.items():
-            if len(vals) >= 5:
-                mu = mean(vals)
-                sigma = pstdev(vals) if len(vals) > 1 else 1.0
+        mu_arr = np.full(n, gym_mu)
+        sigma_arr = np.full(n, gym_sigma)
+        for c in np.unique(cats):
+            mask = cats == c
+            if mask.sum() >= 5:
+                mu, sigma = mean_pstdev(mph[mask])
                 if sigma == 0: sigma = 1.0
-                cat_baselines[c] = (mu, sigma)
-            else:
-                cat_baselines[c] = (gym_mu, gym_sigma)
-
-        def to_iq(mph: float, mu: float, sigma: float) -> int:
-            z = (mph - mu) / sigma
-            iq = round(100 + 15 * z)
-            return max(0, min(200, iq))
+                mu_arr = np.where(mask, mu, mu_arr)
+                sigma_arr = np.where(mask, sigma, sigma_arr)
 
         # Assign IQ and deltaIQ
-        for it in items:
-            mu, sigma = cat_baselines.get(it['category'], (gym_mu, gym_sigma))
-            it['iq'] = to_iq(it['mph'], mu, sigma)
-            it['iq_prev'] = to_iq(it['mph_prev'], mu, sigma)
-            it['delta_iq'] = it['iq'] - it['iq_prev']
-
-        # Gym IQ: mean of machine IQs
-        self.gym_iq = round(mean([it['iq'] for it in items])) if items else 100
-        self.gym_band = self.band_for_score(self.gym_iq)
+        iq_arr = compute_iq_arr(mph, mu_arr, sigma_arr)
+        iq_prev_arr = compute_iq_arr(mph_prev, mu_arr, sigma_arr)
+        cols['mph'] = mph
+        cols['mph_prev'] = mph_prev
+        cols['iq'] = iq_arr
+        cols['iq_prev'] = iq_prev_arr
+        cols['delta_iq'] = iq_arr - iq_prev_arr
 
     @staticmethod
-    def band_for_score(iq: int) -> str:
-        if iq < 90:
-            return 'Below Average'
-        elif iq <= 110:
-            return 'Average'
-        return 'Above Average'
+    def build_equipment_records(cols: Dict[str, np.ndarray]) -> List[EquipRec]:
+        columns = [cols[key].tolist() for key in EquipRec._fields]
+        return [EquipRec(*values) for values in zip(*columns)]
 
     def get_current_week_label(self):
-        today = datetime.now()
-        week_start = today - timedelta(days=today.weekday())
-        week_end = week_start + timedelta(days=6)
-        start_fmt_month = week_start.strftime('%b')
-        end_fmt_month = week_end.strftime('%b')
-        if week_start.month == week_end.month:
-            label = f"{start_fmt_month} {week_start.day}–{week_end.day}, {week_end.year}"
-        else:
-            label = f"{start_fmt_month} {week_start.day} – {end_fmt_month} {week_end.day}, {week_end.year}"
-        return label
-
-    def setup_routes(self):
-        @self.app.route('/')
-        def dashboard():
+        return _week_label_for(datetime.now().toordinal())
+
+    def get_summary(self) -> Tuple[bytes, str]:
+        # Payload only changes when the week label rolls over at midnight. Body and ETag
+        # are stored as one tuple so concurrent requests never mix old and new halves.
+        ordinal = datetime.now().toordinal()
+        summary = self._summary
+        if ordinal != self._summary_ordinal:
+            body = orjson.dumps({'success': True,
+                                 'stats': {
+                                     'gym_iq': self.gym_iq,
+                                     'gym_band': self.gym_band,
+                                     'week_label': _week_label_for(ordinal),
+                                 }})
+            summary = (body, hashlib.blake2b(body, digest_size=16).hexdigest())
+            self._summary = summary
+            self._summary_ordinal = ordinal
+        return summary
+
+    def render_dashboard(self) -> str:
+        if not self.production:
             return render_template('dashboard_iq.html',
                                    week_label=self.get_current_week_label(),
                                    gym_iq=self.gym_iq,
                                    gym_band=self.gym_band)
 
+        # Template inputs only change daily, so reuse the page until the date rolls over
+        ordinal = datetime.now().toordinal()
+        if ordinal != self._dashboard_ordinal:
+            if self._tmpl is None:
+                self._tmpl = self.app.jinja_env.get_template('dashboard_iq.html')
+            self._dashboard_html = self._tmpl.render(week_label=_week_label_for(ordinal),
+                                                     gym_iq=self.gym_iq,
+                                                     gym_band=self.gym_band)
+            self._dashboard_ordinal = ordinal
+        return self._dashboard_html
+
+    def cached(self, timeout: int):
+        if self.cache is None:
+            return lambda view: view
+        return self.cache.cached(timeout=timeout)
+
+    def setup_routes(self):
+        @self.app.route('/')
+        @self.cached(timeout=30)
+        def dashboard():
+            try:
+                html = self.render_dashboard()
+            except Exception:
+                if self._last_dashboard_html is None:
+                    raise
+                self.app.logger.exception('Dashboard render failed; serving last good copy')
+                html = self._last_dashboard_html
+            else:
+                self._last_dashboard_html = html
+            return Response(html, mimetype='text/html')
+
         @self.app.route('/api/equipment')
         def api_equipment():
-            return jsonify({'success': True, 'equipment': self.equipment_data, 'total_count': len(self.equipment_data)})
+            # identity goes last so it only wins when the client ranks it higher
+            encoding = request.accept_encodings.best_match([*self._equipment_encoded, 'identity'])
+            if encoding is None or encoding == 'identity':
+                response = Response(self._equipment_bytes, mimetype='application/json')
+            else:
+                response = Response(self._equipment_encoded[encoding], mimetype='application/json')
+                response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
 
         @self.app.route('/api/summary')
         def api_summary():
-            return jsonify({'success': True,
-                            'stats': {
-                                'gym_iq': self.gym_iq,
-                                'gym_band': self.gym_band,
-                                'week_label': self.get_current_week_label(),
-                            }})
-
-    def run(self, host='0.0.0.0', port=8086, debug=True):
+            body, etag = self.get_summary()
+            response = Response(body, mimetype='application/json')
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'max-age=30'
+            # Weak If-None-Match comparison; 304 with no body on match
+            return response.make_conditional(request)
+
+    def setup_profiler(self):
+        # Append ?profile=1 to any URL to get a pyinstrument report instead of the response
+        @self.app.before_request
+        def start_profiler():
+            if request.args.get('profile') == '1':
+                g.profiler = Profiler()
+                g.profiler.start()
+
+        @self.app.after_request
+        def stop_profiler(response):
+            profiler = g.pop('profiler', None)
+            if profiler is None:
+                return response
+            profiler.stop()
+            return Response(profiler.output_html(), mimetype='text/html')
+
+    def run(self, host='0.0.0.0', port=8086, debug=None):
+        if debug is None:
+            debug = os.environ.get('FLOORIQ_DEBUG') == '1'
         print(f"Starting FloorIQ IQ Dashboard on http://{host}:{port}")
-        self.app.run(host=host, port=port, debug=debug, threaded=True)
+        self.app.run(host=host, port=port, debug=debug, use_reloader=False, threaded=True)
 
 
 def main():
     app = FloorIQIQApp()
-    app.run(port=8086, debug=True)
+    app.run(port=8086)
+
+
+# WSGI entry point for production servers, e.g.
+#   FLOORIQ_WSGI=1 gunicorn -w 4 -k gthread --threads 8 -b 0.0.0.0:8086 app:application
+if os.environ.get('FLOORIQ_WSGI') == '1':
+    application = FloorIQIQApp(production=True).app
 
 
 if __name__ == '__main__':